@@ -3,29 +3,215 @@ dotty-mcp MCP Server - A Scala 3 (Dotty) compiler wrapper MCP server
 """
 
 import argparse
+import asyncio
 import atexit
+import codecs
+import hashlib
+import json
+import os
+import re
 import shlex
+import shutil
+import socket
+import threading
+import time
+import weakref
+from collections import OrderedDict
 from pathlib import Path
-from typing import List, Optional
+from typing import Awaitable, Callable, Iterator, List, Optional, Sequence
 
 import pexpect
-from mcp.server.fastmcp import FastMCP
+from mcp.server.fastmcp import Context, FastMCP
+
+
+# Diagnostics reported by SBT, as (severity, message) pairs
+Diagnostics = List[tuple[str, str]]
+
+
+def _decode(data) -> str:
+    """Decode raw process output, replacing undecodable bytes."""
+    if isinstance(data, bytes):
+        return data.decode('utf-8', errors='replace')
+    return str(data)
+
+
+class _LazyMessage:
+    """An exception message that is only formatted when it is displayed."""
+
+    def __init__(self, render: Callable[[], str]):
+        self.render = render
+
+    def __str__(self) -> str:
+        return self.render()
+
+
+class _LineForwarder:
+    """
+    Forwards streamed output in whole lines, at most once per interval.
+
+    The echo of the command is left out, and forwarding stops for good once
+    the callback raises, e.g. when the client went away.
+    """
+
+    def __init__(self, callback: Callable[[str], None], command: str, interval: float):
+        self.callback: Optional[Callable[[str], None]] = callback
+        self.command = command
+        self.interval = interval
+        self._pending = ''
+        self._echo_checked = False
+        self._last = time.monotonic()
+
+    def feed(self, chunk: str):
+        """Take a chunk of output, forwarding the complete lines if it is time to."""
+        if self.callback is None:
+            return
+        self._pending += chunk
+        if time.monotonic() - self._last >= self.interval:
+            self._send(final=False)
+
+    def flush(self):
+        """Forward the rest of the output."""
+        self._send(final=True)
+
+    def _send(self, final: bool):
+        if not self._echo_checked:
+            first_line, newline, rest = self._pending.partition('\n')
+            if not newline and not final:
+                return
+            if self.command in first_line:
+                self._pending = rest
+            self._echo_checked = True
+
+        if final:
+            text, self._pending = self._pending, ''
+        else:
+            text, newline, self._pending = self._pending.rpartition('\n')
+            if not newline:
+                return
+
+        self._last = time.monotonic()
+        # The terminal turns line endings into \r\n, on top of those of SBT
+        text = re.sub(r'\r+\n', '\n', text).strip('\r\n')
+        if text and self.callback is not None:
+            try:
+                self.callback(text)
+            except Exception:
+                self.callback = None
 
 
 class SBTProcess:
-    """Manages a persistent SBT process for the Dotty compiler."""
+    """
+    Manages a persistent SBT process for the Dotty compiler.
+
+    By default the process is an SBT thin client attached to the SBT server of
+    the project, which outlives this process so that the warm JVM is reused
+    across restarts of the MCP server. In exclusive mode a dedicated SBT
+    process is spawned instead and shut down on close.
+    """
+
+    # Standard SBT prompt like "sbt:scala3> " or "sbt:scala3-nonbootstrapped> "
+    _PROMPT = re.compile(rb'sbt:[\w-]+>\s*')
 
-    def __init__(self, root: Path):
+    # Simple > prompt
+    _SIMPLE = re.compile(rb'>\s*$')
+
+    # Asked on startup while another SBT of the build boots or runs its server
+    _NEW_SERVER = re.compile(rb'Create a new server\? y/n[^\n]*')
+
+    # Diagnostic lines in SBT output like "[error] -- Error: tests/pos/A.scala:1:0"
+    _DIAGNOSTIC = re.compile(r'^\[(error|warn|info)\] ?(.*?)\r?$', re.MULTILINE)
+
+    # Marker of error lines anywhere in SBT output, for errors not reported as diagnostics
+    _ERROR = re.compile(r'\[error\]', re.IGNORECASE)
+
+    # Number of bytes read from SBT at a time when streaming output
+    CHUNK_SIZE = 8192
+
+    # Number of trailing bytes held back while streaming, as they may be the
+    # beginning of a prompt split across reads
+    PROMPT_TAIL = 128
+
+    # Seconds a thin client is given to return to its prompt after cancelling
+    CANCEL_TIMEOUT = 30
+
+    # Minimum number of seconds between two forwards of streamed output
+    FORWARD_INTERVAL = 0.5
+
+    def __init__(self, root: Path, exclusive: bool = False):
         """
         Initialize an SBT process.
 
         Args:
             root: Root directory of the Dotty project
+            exclusive: Whether to run a dedicated SBT process instead of
+                       attaching to the shared SBT server
         """
         self.root = root
+        self.exclusive = exclusive
         self.process: Optional[pexpect.spawn] = None
+        # Cleared once the process is seen to exit, so that commands do not
+        # need to poll the child with waitpid
+        self._alive = False
+        # The exact prompt, which stays fixed once SBT has shown it
+        self._prompt_literal: Optional[bytes] = None
+        self._finalizer: Optional[weakref.finalize] = None
         self._start_process()
 
+    @property
+    def alive(self) -> bool:
+        """Whether the SBT process is running, as far as its output tells."""
+        return self._alive
+
+    def _server_running(self) -> bool:
+        """Check whether the SBT server of the project accepts connections."""
+        # SBT advertises the socket of its running server in active.json
+        active = self.root / "project" / "target" / "active.json"
+        try:
+            uri = json.loads(active.read_text())["uri"]
+        except (OSError, ValueError, KeyError, TypeError):
+            return False
+
+        if not uri.startswith("local://"):
+            return False
+
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            try:
+                sock.connect(uri[len("local://"):])
+            except OSError:
+                return False
+        return True
+
+    def _attach_or_spawn(self, sbt: str) -> tuple[pexpect.spawn, int]:
+        """
+        Attach to the running SBT server, or spawn a new one.
+
+        Args:
+            sbt: Path to the SBT launcher
+
+        Returns:
+            Tuple of (process, startup timeout in seconds)
+        """
+        if self.exclusive:
+            args, startup_timeout = ['-no-colors'], 120
+        elif self._server_running():
+            args, startup_timeout = ['--client', '-no-colors'], 30
+        else:
+            # The thin client boots a detached server that survives the client
+            args, startup_timeout = ['--client', '-no-colors'], 120
+
+        # Output is read as bytes and only decoded once per command; the
+        # search window keeps prompt matching independent of the output size
+        process = pexpect.spawn(
+            sbt,
+            args,
+            cwd=str(self.root),
+            timeout=300,
+            echo=False,
+            maxread=65536,
+            searchwindowsize=4096
+        )
+        return process, startup_timeout
+
     def _start_process(self):
         """Start the SBT process and wait for it to be ready."""
         if not self.root.exists():
@@ -35,119 +221,568 @@ class SBTProcess:
         if not (self.root / "build.sbt").exists():
             raise ValueError(f"No build.sbt found in {self.root}. Not a valid SBT project.")
 
+        sbt = shutil.which('sbt')
+        if sbt is None:
+            raise ValueError("sbt not found on PATH.")
+
         try:
-            self.process = pexpect.spawn(
-                'sbt -no-colors',
-                cwd=str(self.root),
-                encoding='utf-8',
-                timeout=300,
-                echo=False
-            )
+            self.process, startup_timeout = self._attach_or_spawn(sbt)
+            self._finalizer = weakref.finalize(self, SBTProcess._cleanup, self.process)
 
             # Wait for SBT prompt - now without ANSI color codes
-            index = self.process.expect([
-                r'sbt:[\w-]+>\s*',     # Standard prompt like "sbt:scala3> " or "sbt:scala3-nonbootstrapped> "
-                r'>\s*$',              # Simple > prompt
-                pexpect.TIMEOUT,
-                pexpect.EOF
-            ], timeout=120)
-
-            if index >= 3:  # TIMEOUT or EOF
-                raise RuntimeError(f"Failed to match prompt. Index: {index}")
+            deadline = time.monotonic() + startup_timeout
+            while True:
+                index = self.process.expect([
+                    self._PROMPT,
+                    self._SIMPLE,
+                    pexpect.TIMEOUT,
+                    pexpect.EOF,
+                    self._NEW_SERVER
+                ], timeout=max(0, deadline - time.monotonic()))
+                if index != 4:
+                    break
+                # Another process of the build holds the server, so this one
+                # runs as a separate SBT instance
+                self.process.sendline('y')
+
+            if index == 2:
+                raise pexpect.exceptions.TIMEOUT("Timed out waiting for the SBT prompt")
+            if index == 3:
+                raise pexpect.exceptions.EOF("SBT exited before showing its prompt")
+
+            if index == 0:
+                self._prompt_literal = self.process.after.rstrip()
+            self._alive = True
 
         except pexpect.exceptions.TIMEOUT:
+            # The buffers can be large, so they are only decoded if the error is displayed
             buffer_content = self.process.buffer if hasattr(self.process, 'buffer') else 'N/A'
             before_content = self.process.before if hasattr(self.process, 'before') else 'N/A'
-            raise RuntimeError(
+            raise RuntimeError(_LazyMessage(lambda: (
                 f"SBT process failed to start within timeout period.\n"
-                f"Buffer: {buffer_content}\n"
-                f"Before: {before_content}"
-            )
+                f"Buffer: {_decode(buffer_content)}\n"
+                f"Before: {_decode(before_content)}"
+            )))
         except pexpect.exceptions.EOF:
             before_content = self.process.before if hasattr(self.process, 'before') else 'N/A'
-            raise RuntimeError(
+            raise RuntimeError(_LazyMessage(lambda: (
                 f"SBT process terminated unexpectedly during startup.\n"
-                f"Before: {before_content}"
-            )
+                f"Before: {_decode(before_content)}"
+            )))
         except Exception as e:
             raise RuntimeError(f"Failed to start SBT process: {e}")
 
-    def execute_command(self, command: str, timeout: int = 300) -> tuple[str, int]:
+    def _find_prompt(self, data: bytes) -> int:
+        """Return the position of the SBT prompt in the given output, or -1."""
+        if self._prompt_literal is not None:
+            position = data.find(self._prompt_literal)
+            if position >= 0:
+                return position
+
+        # The prompt changes with the current project, which the user may
+        # switch on the shared server, so fall back to the pattern
+        match = self._PROMPT.search(data)
+        if match is None:
+            return -1
+        self._prompt_literal = match.group().rstrip()
+        return match.start()
+
+    def execute_command_stream(self, command: str, timeout: Optional[int] = 300,
+                               idle_timeout: Optional[int] = None) -> Iterator[str]:
         """
-        Execute a command in the SBT console.
+        Execute a command in the SBT console, yielding its output as it arrives.
+
+        The output is yielded raw, including the echo of the command, and ends
+        before the next prompt.
 
         Args:
             command: The SBT command to execute
-            timeout: Timeout in seconds
+            timeout: Timeout in seconds for the whole command, or None
+            idle_timeout: Timeout in seconds without any output, or None
 
-        Returns:
-            Tuple of (output, exit_code)
+        Raises:
+            pexpect.exceptions.TIMEOUT: If the command does not complete in time
+            pexpect.exceptions.EOF: If the SBT process terminates
         """
-        if self.process is None or not self.process.isalive():
+        if not self._alive:
             raise RuntimeError("SBT process is not running")
 
+        # Send the command
         try:
-            # Send the command
             self.process.sendline(command)
+        except OSError:
+            self._alive = False
+            raise pexpect.exceptions.EOF("SBT process terminated")
 
-            # Wait for the command to complete and return to prompt
-            self.process.expect(r'sbt:[\w-]+>\s*', timeout=timeout)
+        decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        start = time.monotonic()
+        deadline = start + timeout if timeout is not None else None
+        idle_deadline = start + idle_timeout if idle_timeout is not None else None
 
-            # Get the output (everything before the next prompt)
-            output = self.process.before
+        # Start from whatever pexpect buffered past the previous prompt
+        pending = self.process.buffer
+        self.process.buffer = b''
+
+        completed = False
+        try:
+            while True:
+                # Stop at the next prompt
+                prompt = self._find_prompt(pending)
+                if prompt >= 0:
+                    completed = True
+                    output = decoder.decode(pending[:prompt], final=True)
+                    if output:
+                        yield output
+                    return
+
+                # Yield all but the tail, which may hold a partial prompt
+                cut = len(pending) - self.PROMPT_TAIL
+                if cut > 0:
+                    output = decoder.decode(pending[:cut])
+                    pending = pending[cut:]
+                    if output:
+                        yield output
+
+                now = time.monotonic()
+                if deadline is not None and now >= deadline:
+                    raise pexpect.exceptions.TIMEOUT(f"Command timed out after {timeout} seconds")
+                if idle_deadline is not None and now >= idle_deadline:
+                    raise pexpect.exceptions.TIMEOUT(f"Command produced no output for {idle_timeout} seconds")
+                remaining = min(d for d in (deadline, idle_deadline, now + 1) if d is not None) - now
+                try:
+                    pending += self.process.read_nonblocking(self.CHUNK_SIZE, timeout=remaining)
+                except pexpect.exceptions.TIMEOUT:
+                    continue
+                if idle_deadline is not None:
+                    idle_deadline = time.monotonic() + idle_timeout
+        finally:
+            # Covers timeouts, EOF and consumers that stop reading early
+            if not completed:
+                self._abandon()
+
+    def _cancel(self) -> bool:
+        """
+        Cancel the running command of a thin client and wait for the prompt.
+
+        The SBT server keeps running commands whose client went away, so the
+        client asks it to cancel the command, as on Ctrl-C, instead.
+
+        Returns:
+            Whether the client is back at its prompt
+        """
+        try:
+            self.process.sendintr()
+            received = b''
+            deadline = time.monotonic() + self.CANCEL_TIMEOUT
+            while self._find_prompt(received) < 0:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                try:
+                    received = received[-self.PROMPT_TAIL:] + self.process.read_nonblocking(
+                        self.CHUNK_SIZE, timeout=min(1, remaining))
+                except pexpect.exceptions.TIMEOUT:
+                    continue
+        except (OSError, pexpect.exceptions.EOF):
+            return False
+        return True
+
+    def _abandon(self):
+        """
+        Give up on a command that was not read up to its prompt.
+
+        SBT may still be running the command, and the rest of its output would
+        be taken for the output of the next command. A thin client cancels the
+        command on the server and stays usable if that succeeds; otherwise the
+        process is terminated and the pool replaces it.
+        """
+        if self.process is None or not self.process.isalive():
+            self._alive = False
+            return
+        if not self.exclusive and self._alive and self._cancel():
+            return
+        self._alive = False
+        self.process.terminate(force=True)
+
+    def execute_command(self, command: str, timeout: Optional[int] = 300,
+                        on_output: Optional[Callable[[str], None]] = None,
+                        idle_timeout: Optional[int] = None) -> tuple[str, int, Diagnostics]:
+        """
+        Execute a command in the SBT console.
+
+        Args:
+            command: The SBT command to execute
+            timeout: Timeout in seconds for the whole command, or None
+            on_output: Called with whole lines of output as they arrive, at
+                       most every FORWARD_INTERVAL seconds; forwarding stops if
+                       it raises
+            idle_timeout: Timeout in seconds without any output, or None
+
+        Returns:
+            Tuple of (output, exit_code, diagnostics)
+        """
+        if not self._alive:
+            raise RuntimeError("SBT process is not running")
+
+        try:
+            # Collect the output (everything before the next prompt)
+            forwarder = _LineForwarder(on_output, command, self.FORWARD_INTERVAL) if on_output is not None else None
+            chunks = []
+            for chunk in self.execute_command_stream(command, timeout, idle_timeout):
+                chunks.append(chunk)
+                if forwarder is not None:
+                    forwarder.feed(chunk)
+            if forwarder is not None:
+                forwarder.flush()
+            output = ''.join(chunks)
 
             # Clean up the output - remove the command echo and extra whitespace
-            lines = output.split('\n')
-            if lines and command in lines[0]:
-                lines = lines[1:]  # Remove command echo
-            output = '\n'.join(lines).strip()
+            first_line, _, rest = output.partition('\n')
+            if command in first_line:
+                output = rest  # Remove command echo
+            output = output.strip()
 
             # Check if compilation was successful
             # SBT returns success/error status in the prompt, but we'll check output
-            exit_code = 1 if '[error]' in output.lower() else 0
+            diagnostics = [(match.group(1), match.group(2)) for match in self._DIAGNOSTIC.finditer(output)]
+            has_errors = (any(severity == 'error' for severity, _ in diagnostics)
+                          or self._ERROR.search(output) is not None)
+            exit_code = 1 if has_errors else 0
 
-            return output, exit_code
+            return output, exit_code, diagnostics
 
-        except pexpect.exceptions.TIMEOUT:
-            return f"Command timed out after {timeout} seconds", 1
+        except pexpect.exceptions.TIMEOUT as e:
+            # The stream already cancelled the command or abandoned the process
+            return str(e), 1, []
         except pexpect.exceptions.EOF:
-            return "SBT process terminated unexpectedly", 1
+            self._alive = False
+            return "SBT process terminated unexpectedly", 1, []
         except Exception as e:
-            return f"Error executing command: {e}", 1
+            # The stream already cancelled the command or abandoned the process
+            return f"Error executing command: {e}", 1, []
 
     def close(self):
-        """Close the SBT process."""
-        if self.process and self.process.isalive():
+        """
+        Close the SBT process.
+
+        In exclusive mode this shuts SBT down; otherwise only the thin client
+        exits and the SBT server stays warm for the next session.
+        """
+        self._alive = False
+        if self._finalizer is not None:
+            self._finalizer()
+
+    @staticmethod
+    def _cleanup(process: pexpect.spawn):
+        """
+        Exit an SBT process.
+
+        Registered with weakref.finalize, so it runs once: on close, when the
+        SBTProcess is collected, or at interpreter exit.
+        """
+        if process.isalive():
             try:
-                self.process.sendline('exit')
-                self.process.expect(pexpect.EOF, timeout=10)
+                process.sendline('exit')
+                process.expect(pexpect.EOF, timeout=10)
             except:
-                self.process.terminate(force=True)
+                process.terminate(force=True)
+
+
+class SBTPool:
+    """
+    A pool of SBT processes shared by concurrent tool calls.
+
+    Processes are started lazily, up to the size of the pool. Every SBT process
+    is a JVM of about 1 GB, and processes of the same build share its target
+    directories, so the pool holds a single process unless asked otherwise.
+    Thin clients all share the one SBT server of the build, which runs their
+    commands one after another, so larger pools require exclusive mode.
+    """
+
+    def __init__(self, root: Path, size: int = 1, exclusive: bool = False):
+        """
+        Initialize an SBT pool.
+
+        Args:
+            root: Root directory of the Dotty project
+            size: Maximum number of SBT processes
+            exclusive: Whether to run dedicated SBT processes instead of
+                       attaching to the shared SBT server
+        """
+        if size > 1 and not exclusive:
+            raise ValueError("More than one SBT process requires exclusive mode.")
+
+        self.root = root
+        self.size = size
+        self.exclusive = exclusive
+        self._workers: List[SBTProcess] = []
+        self._slots = 0
+        # A process started ahead of the first tool call, and the lock that
+        # keeps a tool call from starting another one meanwhile
+        self._warm: Optional[SBTProcess] = None
+        self._start_lock = threading.Lock()
+        # Set once a tool call started a process, which makes pre-warming moot
+        self._started = False
+        # Idle processes; None wakes up a waiter after a slot was freed
+        self._idle: asyncio.Queue[Optional[SBTProcess]] = asyncio.Queue()
+
+    def _start_worker(self) -> SBTProcess:
+        """Start an SBT process, or take over the pre-warmed one."""
+        with self._start_lock:
+            self._started = True
+            if self._warm is not None:
+                process, self._warm = self._warm, None
+                return process
+            return SBTProcess(self.root, self.exclusive)
+
+    def prewarm(self):
+        """
+        Start an SBT process ahead of the first tool call.
+
+        Meant to run in a background thread while the MCP session is set up.
+        """
+        with self._start_lock:
+            if self._warm is not None or self._started:
+                return
+            try:
+                self._warm = SBTProcess(self.root, self.exclusive)
+            except Exception:
+                # The first tool call will retry and report the error
+                pass
+
+    async def acquire(self) -> SBTProcess:
+        """Take an idle SBT process, starting a new one if the pool is not full."""
+        while True:
+            if self._idle.empty() and self._slots < self.size:
+                self._slots += 1
+                try:
+                    process = await asyncio.to_thread(self._start_worker)
+                except BaseException:
+                    self._slots -= 1
+                    self._idle.put_nowait(None)
+                    raise
+                self._workers.append(process)
+                return process
+
+            process = await self._idle.get()
+            if process is not None:
+                return process
+
+    def release(self, process: SBTProcess):
+        """Return an SBT process to the pool, discarding it if it died."""
+        if process.alive:
+            self._idle.put_nowait(process)
+        else:
+            self._workers.remove(process)
+            self._slots -= 1
+            self._idle.put_nowait(None)
+
+    async def execute_command(self, command: str,
+                              on_output: Optional[Callable[[str], Awaitable[None]]] = None,
+                              timeout: Optional[int] = 300,
+                              idle_timeout: Optional[int] = None
+                              ) -> tuple[str, int, Diagnostics]:
+        """
+        Execute a command on an idle SBT process without blocking the event loop.
+
+        Args:
+            command: The SBT command to execute
+            on_output: Awaited with whole lines of output as they arrive
+            timeout: Timeout in seconds for the whole command, or None
+            idle_timeout: Timeout in seconds without any output, or None
+
+        Returns:
+            Tuple of (output, exit_code, diagnostics)
+        """
+        if on_output is None:
+            forward = None
+        else:
+            loop = asyncio.get_running_loop()
 
-    def __del__(self):
-        """Cleanup when the object is destroyed."""
-        self.close()
+            def forward(lines: str):
+                # Wait for the lines to be handled, to keep them in order
+                asyncio.run_coroutine_threadsafe(on_output(lines), loop).result()
+
+        process = await self.acquire()
+        try:
+            task = asyncio.ensure_future(asyncio.to_thread(
+                process.execute_command, command, timeout, forward, idle_timeout))
+        except BaseException:
+            self.release(process)
+            raise
+
+        # Release the process once the worker thread is done with it: if this
+        # call is cancelled, the thread still reads the command up to its prompt
+        task.add_done_callback(lambda _: self.release(process))
+        return await asyncio.shield(task)
+
+    def close(self):
+        """Close all SBT processes."""
+        if self._warm is not None:
+            self._warm.close()
+        for process in self._workers:
+            process.close()
 
 
 class DottyProject:
     """Represents a Dotty project and provides compilation operations."""
 
-    def __init__(self, root: Path):
+    # Maximum number of memoized scalac results
+    SCALAC_CACHE_SIZE = 256
+
+    # Maximum number of memoized testCompilation results, which can be large
+    TEST_COMPILATION_CACHE_SIZE = 16
+
+    # Inputs of the compiler under development, relative to the root: the
+    # sources built into the compiler and the build definition
+    COMPILER_INPUTS = ("compiler/src", "library/src", "tasty/src", "interfaces/src", "project", "build.sbt")
+
+    # Further inputs of the compilation test suite: the test framework and its
+    # exclude lists
+    TEST_COMPILATION_INPUTS = ("compiler/test",)
+
+    # Seconds a scalac command may take, including rebuilding the compiler
+    SCALAC_TIMEOUT = 300
+
+    # Seconds testCompilation may go without output: the whole suite runs far
+    # longer than any fixed limit, but reports progress while it runs
+    TEST_COMPILATION_IDLE_TIMEOUT = 900
+
+    def __init__(self, root: Path, exclusive: bool = False, workers: int = 1):
         """
         Initialize a Dotty project.
 
         Args:
             root: Root directory of the Dotty project
+            exclusive: Whether to run dedicated SBT processes instead of
+                       attaching to the shared SBT server
+            workers: Maximum number of SBT processes serving tool calls
         """
         self.root = root
-        self.sbt_process: Optional[SBTProcess] = None
+        self.sbt_pool = SBTPool(root, workers, exclusive)
+        self._scalac_cache: OrderedDict[tuple, tuple[str, int, Diagnostics]] = OrderedDict()
+        self._testcomp_cache: OrderedDict[tuple, tuple[str, int, Diagnostics]] = OrderedDict()
+        # Running scalac compilations by memoization key
+        self._scalac_running: dict[tuple, asyncio.Task] = {}
 
-    def ensure_sbt_running(self):
-        """Ensure the SBT process is running."""
-        if self.sbt_process is None:
-            self.sbt_process = SBTProcess(self.root)
+    def _source_digest(self, paths, filters: Sequence[str] = ()) -> str:
+        """
+        Fingerprint the given files and the files under the given directories.
 
-    def scalac(self, files: List[str], options: List[str]) -> str:
+        Only paths, modification times and sizes are hashed, so this is cheap
+        compared to a compilation round-trip through SBT. Build outputs in
+        target directories are skipped.
+
+        Args:
+            paths: Files and directories to fingerprint (relative to project root)
+            filters: Only include files whose relative path contains one of
+                     these substrings, if any are given
+
+        Returns:
+            Hex digest of the contents
+        """
+        digest = hashlib.blake2b(digest_size=16)
+
+        def update(relpath: str, path):
+            if filters and not any(f in relpath for f in filters):
+                return
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                return
+            digest.update(f"{relpath}\0{stat.st_mtime_ns}\0{stat.st_size}\n".encode())
+
+        for entry in paths:
+            top = self.root / entry
+            if top.is_file():
+                update(entry, top)
+                continue
+            for dirpath, dirnames, filenames in os.walk(top):
+                dirnames[:] = sorted(name for name in dirnames if name != "target")
+                reldir = os.path.relpath(dirpath, self.root)
+                for name in sorted(filenames):
+                    update(os.path.join(reldir, name), os.path.join(dirpath, name))
+        return digest.hexdigest()
+
+    @staticmethod
+    def _diagnostics_summary(diagnostics: Diagnostics) -> str:
+        """
+        Summarize the errors and warnings reported by the compiler.
+
+        Scala 3 starts every diagnostic with a header line like
+        "-- [E007] Type Mismatch Error: tests/neg/A.scala:3:4", so the summary
+        lists those headers.
+
+        Returns:
+            The summary followed by a blank line, or an empty string if there
+            are no errors or warnings
+        """
+        sections = []
+        for severity, title in (('error', 'Errors'), ('warn', 'Warnings')):
+            headers = [message for kind, message in diagnostics
+                       if kind == severity and message.startswith('-- ')]
+            if headers:
+                sections.append(f"{title} ({len(headers)}):\n" + "\n".join(headers))
+        return "".join(f"{section}\n\n" for section in sections)
+
+    @staticmethod
+    def _is_verdict(result: tuple[str, int, Diagnostics], sources: Optional[Sequence[str]] = None) -> bool:
+        """
+        Check whether a result is a verdict of the compiler worth memoizing.
+
+        Failures are only verdicts if the compiler reported an error or warning
+        for the sources; timeouts, crashes and build errors may be transient.
+
+        Args:
+            result: Tuple of (output, exit_code, diagnostics)
+            sources: Only count diagnostics naming one of these files, rather
+                     than files the same command rebuilt, if given
+        """
+        _, exit_code, diagnostics = result
+        return exit_code == 0 or any(
+            kind in ('error', 'warn') and message.startswith('-- ')
+            and (sources is None or any(f"{file}:" in message for file in sources))
+            for kind, message in diagnostics)
+
+    @staticmethod
+    def _memoize(cache: OrderedDict, key: tuple, result: tuple[str, int, Diagnostics], size: int):
+        """Store a result in an LRU cache, evicting the least recently used entry."""
+        cache[key] = result
+        if len(cache) > size:
+            cache.popitem(last=False)
+
+    def _scalac_cache_key(self, source_files: List[str], all_options: List[str],
+                          compiler_digest: str) -> Optional[tuple]:
+        """
+        Compute the memoization key of a scalac invocation.
+
+        Returns None when one of the source files cannot be accessed, in which
+        case scalac reports the error itself and cached results mentioning a
+        file that no longer exists are dropped.
+        """
+        try:
+            stamps = tuple((file, (self.root / file).stat().st_mtime_ns) for file in source_files)
+        except OSError:
+            stale = [key for key in self._scalac_cache
+                     if any(not (self.root / file).exists() for file, _ in key[0])]
+            for key in stale:
+                del self._scalac_cache[key]
+            return None
+
+        # Options are kept in order since scalac options may take arguments
+        return stamps, tuple(all_options), compiler_digest
+
+    async def _compile(self, key: tuple, command: str, source_files: List[str]) -> tuple[str, int, Diagnostics]:
+        """Run a scalac command and memoize its result under the given key."""
+        result = await self.sbt_pool.execute_command(command, timeout=self.SCALAC_TIMEOUT)
+
+        # Only memoize actual compiler verdicts, not timeouts or crashes
+        if self._is_verdict(result, source_files):
+            self._memoize(self._scalac_cache, key, result, self.SCALAC_CACHE_SIZE)
+
+        return result
+
+    async def scalac(self, files: List[str], options: List[str]) -> str:
         """
         Compile one or more Scala files using the Dotty compiler through SBT.
 
@@ -163,8 +798,6 @@ class DottyProject:
             parseable output without ANSI escape codes.
         """
         try:
-            self.ensure_sbt_running()
-
             source_files = [file for file in files if file]
 
             # Always add -color:never for clean output without ANSI codes
@@ -173,10 +806,28 @@ class DottyProject:
             # Construct the scalac command
             command = shlex.join(["scalac", *source_files, *all_options])
 
-            # Execute the command
-            output, exit_code = self.sbt_process.execute_command(command)
+            # Reuse the previous result if neither the sources, the options nor
+            # the compiler changed since then
+            compiler_digest = await asyncio.to_thread(self._source_digest, self.COMPILER_INPUTS)
+            key = self._scalac_cache_key(source_files, all_options, compiler_digest)
+            if key is None:
+                # Execute the command
+                output, exit_code, diagnostics = await self.sbt_pool.execute_command(
+                    command, timeout=self.SCALAC_TIMEOUT)
+            elif key in self._scalac_cache:
+                self._scalac_cache.move_to_end(key)
+                output, exit_code, diagnostics = self._scalac_cache[key]
+            else:
+                # Identical compilations requested while one is running share its result
+                task = self._scalac_running.get(key)
+                if task is None:
+                    task = asyncio.ensure_future(self._compile(key, command, source_files))
+                    self._scalac_running[key] = task
+                    task.add_done_callback(lambda _: self._scalac_running.pop(key, None))
+                output, exit_code, diagnostics = await asyncio.shield(task)
 
             sources_description = ", ".join(source_files)
+            summary = self._diagnostics_summary(diagnostics)
 
             # Format the output
             if exit_code == 0 and not output:
@@ -185,12 +836,12 @@ class DottyProject:
                 return "Successfully ran scalac"
             elif exit_code == 0 and output:
                 if source_files:
-                    return f"Successfully compiled {sources_description}\n\nOutput:\n{output}"
-                return f"Successfully ran scalac\n\nOutput:\n{output}"
+                    return f"Successfully compiled {sources_description}\n\n{summary}Output:\n{output}"
+                return f"Successfully ran scalac\n\n{summary}Output:\n{output}"
             else:
                 if source_files:
-                    return f"Compilation failed for {sources_description}\n\n{output}"
-                return f"scalac failed\n\n{output}"
+                    return f"Compilation failed for {sources_description}\n\n{summary}{output}"
+                return f"scalac failed\n\n{summary}{output}"
 
         except ValueError as e:
             return f"Error: {e}"
@@ -199,33 +850,59 @@ class DottyProject:
         except Exception as e:
             return f"Unexpected error: {e}"
 
-    def testCompilation(self, pattern: str) -> str:
+    async def testCompilation(self, pattern: str,
+                              on_output: Optional[Callable[[str], Awaitable[None]]] = None) -> str:
         """
         Run the compilation test suite with an optional filter pattern.
 
         Args:
-            pattern: A substring to filter tests by path. If empty, runs all tests.
+            pattern: Space-separated substrings to filter tests by path, and
+                     options of the test suite. If empty, runs all tests.
+            on_output: Awaited with whole lines of test output as they arrive
 
         Returns:
             Test output as a string
         """
         try:
-            self.ensure_sbt_running()
-
             # Construct the testCompilation command
             if pattern:
                 command = f"testCompilation {pattern}"
             else:
                 command = "testCompilation"
 
-            # Execute the command
-            output, exit_code = self.sbt_process.execute_command(command)
+            # Reuse the previous result if neither the selected tests nor the
+            # compiler changed since then. The arguments are filters, each
+            # selecting the tests whose path contains it, or options such as
+            # --update-checkfiles, which have effects and are never cached.
+            arguments = pattern.split()
+            if any(argument.startswith("--") for argument in arguments):
+                key = None
+            else:
+                key = (
+                    tuple(arguments),
+                    await asyncio.to_thread(self._source_digest, ["tests"], arguments),
+                    await asyncio.to_thread(self._source_digest,
+                                            (*self.COMPILER_INPUTS, *self.TEST_COMPILATION_INPUTS)),
+                )
+            if key is not None and key in self._testcomp_cache:
+                self._testcomp_cache.move_to_end(key)
+                output, exit_code, diagnostics = self._testcomp_cache[key]
+            else:
+                # Execute the command
+                output, exit_code, diagnostics = await self.sbt_pool.execute_command(
+                    command, on_output, timeout=None, idle_timeout=self.TEST_COMPILATION_IDLE_TIMEOUT)
+
+                # Only memoize actual test verdicts, not timeouts or crashes
+                result = (output, exit_code, diagnostics)
+                if key is not None and self._is_verdict(result):
+                    self._memoize(self._testcomp_cache, key, result, self.TEST_COMPILATION_CACHE_SIZE)
 
             # Format the output
+            summary = self._diagnostics_summary(diagnostics)
             if exit_code == 0:
-                return f"Test compilation succeeded\n\n{output}" if output else "Test compilation succeeded"
+                return f"Test compilation succeeded\n\n{summary}{output}" if output else "Test compilation succeeded"
             else:
-                return f"Test compilation failed\n\n{output}"
+                return f"Test compilation failed\n\n{summary}{output}"
 
         except ValueError as e:
             return f"Error: {e}"
@@ -235,9 +912,8 @@ class DottyProject:
             return f"Unexpected error: {e}"
 
     def close(self):
-        """Close the SBT process."""
-        if self.sbt_process:
-            self.sbt_process.close()
+        """Close the SBT processes."""
+        self.sbt_pool.close()
 
 
 # Global project instance
@@ -249,7 +925,7 @@ mcp = FastMCP("dotty-mcp")
 
 
 @mcp.tool()
-def scalac(files: List[str], options: List[str] = None) -> str:
+async def scalac(files: List[str], options: List[str] = None) -> str:
     """
     Compile one or more Scala files using the Dotty (Scala 3) compiler under development through SBT.
 
@@ -282,16 +958,17 @@ def scalac(files: List[str], options: List[str] = None) -> str:
     if options is None:
         options = []
 
-    return PROJECT.scalac(files, options)
+    return await PROJECT.scalac(files, options)
 
 
 @mcp.tool()
-def testCompilation(pattern: str = "") -> str:
+async def testCompilation(pattern: str = "", ctx: Context = None) -> str:
     """
     Run the compilation test suite of the development compiler.
 
     This tool runs the Dotty compiler's compilation test suite, which tests
-    the compiler against a collection of Scala source files.
+    the compiler against a collection of Scala source files. The test output
+    is also streamed as log messages while the tests run.
 
     Args:
         pattern: A simple substring (not a regex) to filter tests. All compilation
@@ -308,7 +985,8 @@ def testCompilation(pattern: str = "") -> str:
     if PROJECT is None:
         return "Error: No Dotty project root specified. Use --root argument."
 
-    return PROJECT.testCompilation(pattern)
+    on_output = ctx.info if ctx is not None else None
+    return await PROJECT.testCompilation(pattern, on_output)
 
 
 def main():
@@ -324,9 +1002,29 @@ def main():
         default=Path("."),
         help="Root directory of the Dotty project (defaults to current directory)"
     )
+    parser.add_argument(
+        "--exclusive",
+        action="store_true",
+        help="Run a dedicated SBT process that is shut down on exit, instead of "
+             "attaching to a persistent SBT server"
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Number of dedicated SBT processes serving tool calls concurrently; "
+             "requires --exclusive. Each one is a JVM of about 1 GB, and all of "
+             "them compile into the same target directories, so concurrent "
+             "compilations may interfere (defaults to 1)"
+    )
 
     args = parser.parse_args()
-    PROJECT = DottyProject(args.root.resolve())
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+    if args.workers > 1 and not args.exclusive:
+        parser.error("--workers greater than 1 requires --exclusive, since thin clients "
+                     "share one SBT server that runs their commands one at a time")
+    PROJECT = DottyProject(args.root.resolve(), args.exclusive, args.workers)
 
     # Register cleanup handler
     def cleanup():
@@ -335,6 +1033,9 @@ def main():
 
     atexit.register(cleanup)
 
+    # Start SBT while the client sets up the MCP session
+    threading.Thread(target=PROJECT.sbt_pool.prewarm, daemon=True).start()
+
     # Run the server with stdio transport
     mcp.run(transport='stdio')
 
@@ -0,0 +1,107 @@
+"""
+A stand-in for the SBT launcher, driving a console like SBT's.
+
+Every command is appended to commands.log in the working directory.
+"""
+
+import sys
+import time
+from pathlib import Path
+
+PROMPT = "sbt:fake> "
+
+
+def write(text: str):
+    sys.stdout.write(text)
+    sys.stdout.flush()
+
+
+def scalac(args):
+    # Warnings of the compiler itself, as when the command rebuilds it
+    for file in sorted(Path("compiler/src").glob("*.scala")):
+        if "WARN" in file.read_text():
+            write(f"[warn] -- Warning: {file}:1:0 \n")
+    for file in (arg for arg in args if not arg.startswith("-")):
+        try:
+            source = Path(file).read_text()
+        except OSError as e:
+            write(f"[error] {e}\n")
+            continue
+        if "ERROR" in source:
+            write(f"[error] -- Error: {file}:1:0 \n[error] 1 |ERROR\n[error]   |^^^^^\n")
+        if "WARN" in source:
+            write(f"[warn] -- Warning: {file}:1:0 \n")
+        if "CRASH" in source:
+            write("[error] java.lang.OutOfMemoryError: Java heap space\n")
+    write("[info] done compiling\n")
+
+
+def run(line: str):
+    global PROMPT
+    name, *args = line.split()
+    if name == "scalac":
+        scalac(args)
+    elif name == "sleep":
+        write("[info] sleeping\n")
+        time.sleep(float(args[0]))
+    elif name == "tick":
+        # Report progress every interval, like the compilation test suite
+        count, interval = int(args[0]), float(args[1])
+        for i in range(count):
+            write(f"[info] tick {i}\n")
+            time.sleep(interval)
+    elif name == "progress":
+        # Echo the command, then report progress with terminal line endings
+        write(f"{line}\r\n")
+        for i in range(int(args[0])):
+            write(f"[info] line {i}\r\n")
+            time.sleep(0.1)
+    elif name == "split":
+        # Large output followed by a prompt split across reads
+        write("x" * 20000 + "\n" + PROMPT[:5])
+        time.sleep(0.3)
+        write(PROMPT[5:])
+        return False
+    elif name == "project":
+        # Switching the project changes the prompt
+        PROMPT = f"sbt:{args[0]}> "
+        write(f"[info] set current project to {args[0]}\n")
+    elif name == "exit":
+        sys.exit(0)
+    else:
+        write("[info] success\n")
+    return True
+
+
+def main():
+    root = Path.cwd()
+    with open(root / "commands.log", "a") as log:
+        log.write(f"start {' '.join(sys.argv[1:])}\n")
+
+    if (root / "fail-start").exists():
+        write("[error] boom\n")
+        sys.exit(1)
+
+    if (root / "ask-new-server").exists():
+        write("sbt server is already booting. Create a new server? y/n (default y) ")
+        answer = sys.stdin.readline().strip()
+        with open(root / "commands.log", "a") as log:
+            log.write(f"answer {answer}\n")
+
+    write("[info] welcome to sbt\n" + PROMPT)
+    for line in sys.stdin:
+        line = line.strip()
+        if not line:
+            write(PROMPT)
+            continue
+        with open(root / "commands.log", "a") as log:
+            log.write(line + "\n")
+        try:
+            if run(line):
+                write(PROMPT)
+        except KeyboardInterrupt:
+            write("[warn] cancelled\n" + PROMPT)
+
+
+if __name__ == "__main__":
+    main()
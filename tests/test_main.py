@@ -0,0 +1,385 @@
+"""
+Tests of the SBT pool, its processes and the memoization of DottyProject.
+
+SBT is replaced by fake_sbt.py, which is put on PATH as the sbt launcher.
+"""
+
+import asyncio
+import gc
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+from dotty_mcp import main
+from dotty_mcp.main import DottyProject, SBTPool, SBTProcess, _LazyMessage
+
+FAKE_SBT = Path(__file__).with_name("fake_sbt.py")
+
+
+@pytest.fixture
+def root(tmp_path, monkeypatch):
+    """A project root with a fake SBT launcher on PATH."""
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    sbt = bin_dir / "sbt"
+    sbt.write_text(f'#!/bin/sh\nexec "{sys.executable}" "{FAKE_SBT}" "$@"\n')
+    sbt.chmod(0o755)
+    monkeypatch.setenv("PATH", f"{bin_dir}{os.pathsep}{os.environ['PATH']}")
+
+    project = tmp_path / "project"
+    (project / "tests" / "pos").mkdir(parents=True)
+    (project / "compiler" / "src").mkdir(parents=True)
+    (project / "build.sbt").write_text("")
+    return project
+
+
+@pytest.fixture
+def dotty(root):
+    project = DottyProject(root)
+    yield project
+    project.close()
+
+
+def commands(root: Path) -> list[str]:
+    """The commands the fake SBT processes received, including their starts."""
+    return (root / "commands.log").read_text().splitlines()
+
+
+def touch(path: Path, text: str):
+    """Write a file and move its modification time forward."""
+    stat = path.stat() if path.exists() else None
+    path.write_text(text)
+    if stat is not None:
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+
+def test_prompt_split_across_reads(root):
+    process = SBTProcess(root, exclusive=True)
+    try:
+        output, exit_code, _ = process.execute_command("split")
+        assert exit_code == 0
+        assert output == "x" * 20000
+        assert process.execute_command("hello")[0] == "[info] success"
+    finally:
+        process.close()
+
+
+def test_prompt_change_is_followed(root):
+    process = SBTProcess(root)
+    try:
+        _, exit_code, _ = process.execute_command("project fake-compiler", timeout=5)
+        assert exit_code == 0
+        assert process.execute_command("hello", timeout=5)[0] == "[info] success"
+        assert process._prompt_literal == b"sbt:fake-compiler>"
+    finally:
+        process.close()
+
+
+def test_timeout_cancels_thin_client_command(root):
+    process = SBTProcess(root)
+    try:
+        output, exit_code, _ = process.execute_command("sleep 30", timeout=1)
+        assert (output, exit_code) == ("Command timed out after 1 seconds", 1)
+        assert process.alive
+        assert process.execute_command("hello")[0] == "[info] success"
+    finally:
+        process.close()
+
+
+def test_failed_command_is_cancelled_once(root, monkeypatch):
+    process = SBTProcess(root)
+    try:
+        read, sendintr = process.process.read_nonblocking, process.process.sendintr
+        interrupts = []
+
+        def failing_read(*args, **kwargs):
+            monkeypatch.setattr(process.process, "read_nonblocking", read)
+            # Fail once SBT is running the command
+            read(*args, **kwargs)
+            raise ValueError("broken read")
+
+        def counting_sendintr():
+            interrupts.append(None)
+            sendintr()
+
+        monkeypatch.setattr(process.process, "read_nonblocking", failing_read)
+        monkeypatch.setattr(process.process, "sendintr", counting_sendintr)
+        output, exit_code, _ = process.execute_command("sleep 1")
+        assert (output, exit_code) == ("Error executing command: broken read", 1)
+        assert len(interrupts) == 1
+        assert process.execute_command("hello")[0] == "[info] success"
+    finally:
+        process.close()
+
+
+def test_timeout_terminates_exclusive_process(root):
+    process = SBTProcess(root, exclusive=True)
+    try:
+        process.execute_command("sleep 30", timeout=1)
+        assert not process.alive
+        assert not process.process.isalive()
+    finally:
+        process.close()
+
+
+def test_idle_timeout_is_reset_by_output(root):
+    process = SBTProcess(root)
+    try:
+        _, exit_code, _ = process.execute_command("tick 6 0.3", timeout=None, idle_timeout=1)
+        assert exit_code == 0
+        output, exit_code, _ = process.execute_command("sleep 30", timeout=None, idle_timeout=1)
+        assert (output, exit_code) == ("Command produced no output for 1 seconds", 1)
+    finally:
+        process.close()
+
+
+def test_new_server_question_is_answered(root):
+    (root / "ask-new-server").touch()
+    process = SBTProcess(root, exclusive=True)
+    try:
+        assert process.alive
+        assert "answer y" in commands(root)
+    finally:
+        process.close()
+
+
+def test_startup_failure_is_formatted_lazily(root):
+    (root / "fail-start").touch()
+    with pytest.raises(RuntimeError) as excinfo:
+        SBTProcess(root, exclusive=True)
+    message = excinfo.value.args[0]
+    assert isinstance(message, _LazyMessage)
+    assert str(message).startswith("SBT process terminated unexpectedly during startup.")
+    assert "[error] boom" in str(excinfo.value)
+
+
+def test_close_exits_sbt_once(root):
+    process = SBTProcess(root, exclusive=True)
+    spawned = process.process
+    process.close()
+    process.close()
+    assert not spawned.isalive()
+    assert commands(root).count("exit") == 1
+
+
+def test_collected_process_exits_sbt(root):
+    process = SBTProcess(root, exclusive=True)
+    spawned = process.process
+    del process
+    gc.collect()
+    assert not spawned.isalive()
+    assert commands(root).count("exit") == 1
+
+
+def test_pool_reuses_idle_process(root):
+    async def run():
+        pool = SBTPool(root)
+        try:
+            await pool.execute_command("first")
+            await pool.execute_command("second")
+        finally:
+            pool.close()
+
+    asyncio.run(run())
+    assert [line for line in commands(root) if line.startswith("start")] == ["start --client -no-colors"]
+
+
+def test_pool_forwards_output_in_whole_lines(root):
+    forwarded = []
+
+    async def on_output(lines: str):
+        forwarded.append(lines)
+
+    async def run():
+        pool = SBTPool(root)
+        try:
+            return await pool.execute_command("progress 12", on_output)
+        finally:
+            pool.close()
+
+    output, _, _ = asyncio.run(run())
+    assert 1 < len(forwarded) < 12
+    assert "\n".join(forwarded) == "\n".join(f"[info] line {i}" for i in range(12))
+    assert "progress" not in output
+
+
+def test_testcompilation_tool_logs_output(root, dotty, monkeypatch):
+    class Context:
+        def __init__(self):
+            self.messages = []
+
+        async def info(self, message: str):
+            self.messages.append(message)
+
+    ctx = Context()
+    monkeypatch.setattr(main, "PROJECT", dotty)
+    result = asyncio.run(main.testCompilation("pos", ctx))
+    assert result == "Test compilation succeeded\n\n[info] success"
+    assert ctx.messages == ["[info] success"]
+
+
+def test_pool_starts_processes_up_to_its_size(root):
+    async def run():
+        pool = SBTPool(root, size=2, exclusive=True)
+        try:
+            await asyncio.gather(*(pool.execute_command("sleep 0.5") for _ in range(3)))
+            assert pool._slots == 2
+        finally:
+            pool.close()
+
+    asyncio.run(run())
+    assert sum(line.startswith("start") for line in commands(root)) == 2
+
+
+def test_pool_replaces_dead_process(root):
+    async def run():
+        pool = SBTPool(root, exclusive=True)
+        try:
+            _, exit_code, _ = await pool.execute_command("sleep 30", timeout=1)
+            assert exit_code == 1
+            # The done callback releasing the process runs on the next iteration
+            await asyncio.sleep(0)
+            assert pool._slots == 0 and not pool._workers
+            assert (await pool.execute_command("hello"))[0] == "[info] success"
+            assert pool._slots == 1
+        finally:
+            pool.close()
+
+    asyncio.run(run())
+    assert sum(line.startswith("start") for line in commands(root)) == 2
+
+
+def test_pool_frees_slot_when_start_fails(root):
+    (root / "build.sbt").unlink()
+
+    async def run():
+        pool = SBTPool(root)
+        with pytest.raises(ValueError):
+            await pool.acquire()
+        assert pool._slots == 0
+        # The token left for waiters does not count as a process
+        (root / "build.sbt").write_text("")
+        process = await pool.acquire()
+        pool.release(process)
+        pool.close()
+
+    asyncio.run(run())
+
+
+def test_prewarm_is_skipped_after_a_start(root):
+    pool = SBTPool(root)
+    # A tool call started a process, but has not added it to the workers yet
+    process = pool._start_worker()
+    try:
+        pool.prewarm()
+        assert pool._warm is None
+    finally:
+        process.close()
+        pool.close()
+
+
+def test_scalac_is_memoized_until_the_source_changes(root, dotty):
+    source = root / "tests" / "pos" / "A.scala"
+    touch(source, "object A")
+
+    assert asyncio.run(dotty.scalac(["tests/pos/A.scala"], [])).startswith("Successfully compiled")
+    asyncio.run(dotty.scalac(["tests/pos/A.scala"], []))
+    assert commands(root).count("scalac tests/pos/A.scala -color:never") == 1
+
+    touch(source, "object A ERROR")
+    result = asyncio.run(dotty.scalac(["tests/pos/A.scala"], []))
+    assert result.startswith("Compilation failed")
+    assert "-- Error: tests/pos/A.scala:1:0" in result
+    assert commands(root).count("scalac tests/pos/A.scala -color:never") == 2
+
+
+def test_scalac_is_rerun_when_the_compiler_changes(root, dotty):
+    touch(root / "tests" / "pos" / "A.scala", "object A")
+    asyncio.run(dotty.scalac(["tests/pos/A.scala"], []))
+    touch(root / "compiler" / "src" / "Typer.scala", "class Typer")
+    asyncio.run(dotty.scalac(["tests/pos/A.scala"], []))
+    assert commands(root).count("scalac tests/pos/A.scala -color:never") == 2
+
+
+def test_scalac_does_not_memoize_failures_without_diagnostics(root, dotty):
+    touch(root / "tests" / "pos" / "A.scala", "CRASH")
+    for _ in range(2):
+        assert asyncio.run(dotty.scalac(["tests/pos/A.scala"], [])).startswith("Compilation failed")
+    assert commands(root).count("scalac tests/pos/A.scala -color:never") == 2
+
+
+def test_scalac_does_not_memoize_failures_with_diagnostics_of_other_files(root, dotty):
+    touch(root / "compiler" / "src" / "Typer.scala", "WARN")
+    touch(root / "tests" / "pos" / "A.scala", "CRASH")
+    for _ in range(2):
+        result = asyncio.run(dotty.scalac(["tests/pos/A.scala"], []))
+        assert "-- Warning: compiler/src/Typer.scala:1:0" in result
+    assert commands(root).count("scalac tests/pos/A.scala -color:never") == 2
+
+
+def test_identical_scalac_calls_are_coalesced(root, dotty):
+    touch(root / "tests" / "pos" / "A.scala", "object A")
+
+    async def run():
+        return await asyncio.gather(*(dotty.scalac(["tests/pos/A.scala"], []) for _ in range(3)))
+
+    assert len(set(asyncio.run(run()))) == 1
+    assert commands(root).count("scalac tests/pos/A.scala -color:never") == 1
+    assert not dotty._scalac_running
+
+
+def test_scalac_runs_uncached_for_inaccessible_paths(root, dotty):
+    touch(root / "tests" / "pos" / "A.scala", "object A")
+    for _ in range(2):
+        result = asyncio.run(dotty.scalac(["tests/pos/A.scala/x"], []))
+        assert not result.startswith("Unexpected error")
+    assert commands(root).count("scalac tests/pos/A.scala/x -color:never") == 2
+
+
+def test_source_digest_includes_files_matching_any_filter(root, dotty):
+    source = root / "tests" / "pos" / "A.scala"
+    touch(source, "object A")
+    before = dotty._source_digest(["tests"], ["neg", "A.scala"])
+    assert before != dotty._source_digest(["tests"], ["nothing"])
+    touch(source, "object A { }")
+    assert dotty._source_digest(["tests"], ["neg", "A.scala"]) != before
+
+
+def test_testcompilation_is_memoized_unless_given_options(root, dotty):
+    touch(root / "tests" / "pos" / "A.scala", "object A")
+    for _ in range(2):
+        asyncio.run(dotty.testCompilation("pos A"))
+        asyncio.run(dotty.testCompilation("pos --update-checkfiles"))
+    assert commands(root).count("testCompilation pos A") == 1
+    assert commands(root).count("testCompilation pos --update-checkfiles") == 2
+
+    touch(root / "tests" / "pos" / "A.scala", "object A { }")
+    asyncio.run(dotty.testCompilation("pos A"))
+    assert commands(root).count("testCompilation pos A") == 2
+
+
+def test_diagnostics_summary_lists_headers():
+    diagnostics = [
+        ("error", "-- [E007] Type Mismatch Error: tests/neg/A.scala:3:4"),
+        ("error", "3 |  val x: Int = \"\""),
+        ("warn", "-- Warning: tests/neg/A.scala:5:0"),
+        ("info", "-- not a diagnostic"),
+    ]
+    assert DottyProject._diagnostics_summary(diagnostics) == (
+        "Errors (1):\n-- [E007] Type Mismatch Error: tests/neg/A.scala:3:4\n\n"
+        "Warnings (1):\n-- Warning: tests/neg/A.scala:5:0\n\n"
+    )
+    assert DottyProject._diagnostics_summary([("info", "done compiling")]) == ""
+
+
+def test_scalac_result_starts_with_the_summary(root, dotty):
+    touch(root / "tests" / "pos" / "A.scala", "ERROR WARN")
+    result = asyncio.run(dotty.scalac(["tests/pos/A.scala"], []))
+    assert result.startswith(
+        "Compilation failed for tests/pos/A.scala\n\n"
+        "Errors (1):\n-- Error: tests/pos/A.scala:1:0 \n\n"
+        "Warnings (1):\n-- Warning: tests/pos/A.scala:1:0 \n\n"
+        "[error] -- Error: tests/pos/A.scala:1:0"
+    )